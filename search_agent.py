@@ -0,0 +1,410 @@
+# pydanticai/search_agent.py
+# Importable module holding the agent, its tools and the FastAPI app. It is not meant to be
+# run directly; start the server with `python search-agent.py`.
+import os
+import sys
+import hashlib
+import atexit
+import logging
+import logging.handlers
+import queue
+import asyncio
+import httpx
+import msgspec
+from contextlib import asynccontextmanager
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from pydantic import BaseModel, Field
+from pydantic_ai import Agent, ModelRetry
+from pydantic_ai.mcp import MCPServerStdio
+from pydantic_ai.agent import RunContext
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, Response
+
+logger = logging.getLogger("search-agent")
+
+def configure_logging():
+    """
+    Attaches a queue-backed handler to the logger: handlers only enqueue records and a
+    background QueueListener thread does the stdout writes. Safe to call more than once.
+    """
+    if logger.handlers:
+        return
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+
+# Load environment variables
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'), override=True)
+FIRECRAWL_API_KEY = os.getenv("FIRECRAWL_API_KEY")
+if not FIRECRAWL_API_KEY:
+    raise RuntimeError("FIRECRAWL_API_KEY is not set. Please ensure it is present in agents/search-agent/.env before starting the server.")
+_BRAVE_KEY = os.getenv("BRAVE_API_KEY")
+if not _BRAVE_KEY:
+    raise RuntimeError("BRAVE_API_KEY is not set. Please ensure it is present in agents/search-agent/.env before starting the server.")
+
+# --- Agent Setup (Keep as is) ---
+
+
+# Instantiate the Firecrawl MCP Server
+# Invoke the locally installed binary (npm i -g firecrawl-mcp) to skip npx's registry resolution on startup
+firecrawl_mcp_command_args = ["/c", "firecrawl-mcp"]
+firecrawl_mcp_env = {"FIRECRAWL_API_KEY": FIRECRAWL_API_KEY} if FIRECRAWL_API_KEY else {}
+firecrawl_server = MCPServerStdio(
+    command='cmd', # Set command to "cmd"
+    args=firecrawl_mcp_command_args,
+    env=firecrawl_mcp_env
+)
+
+# Instantiate the Agent
+agent = Agent(
+    model="gemini-2.5-pro-preview-03-25",
+    system_prompt="You are a helpful web search agent that searches or scrapes the web to find useful information.",
+    instrument=True,
+    mcp_servers=[firecrawl_server]
+)
+
+# Shared async HTTP client for Brave Search (pooled, HTTP/2 so concurrent queries reuse one connection)
+_HTTP = httpx.AsyncClient(
+    http2=True,
+    timeout=10,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+)
+
+# Brave Search request constants (resolved once, constant for the process lifetime)
+_SEARCH_URL = "https://api.search.brave.com/res/v1/web/search"
+_HEADERS = {
+    "Accept": "application/json",
+    "Accept-Encoding": "br, gzip", # Brotli is decoded natively by httpx's brotli extra
+    "X-Subscription-Token": _BRAVE_KEY
+}
+
+# Minimal schema of the Brave Search response; msgspec discards unlisted fields at decode time
+class _BraveResult(msgspec.Struct):
+    # Optional so a null in one result does not fail the decode of the whole response
+    title: str | None = None
+    url: str | None = None
+
+class _BraveWeb(msgspec.Struct):
+    results: list[_BraveResult] = []
+
+class _BraveResponse(msgspec.Struct):
+    web: _BraveWeb = msgspec.field(default_factory=_BraveWeb)
+
+_BRAVE_DECODER = msgspec.json.Decoder(_BraveResponse)
+
+# Short-lived cache of formatted Brave results, keyed on (normalized query, count).
+# Only successful lookups are stored so transient API errors are not pinned.
+# TTLCache is only touched between awaits, so no lock is needed on the event loop.
+_SEARCH_CACHE = TTLCache(maxsize=512, ttl=300)
+
+async def _do_search(query: str, count: int) -> str:
+    """
+    Runs a single Brave Search query and formats the results, using the cache when possible.
+    """
+    cache_key = (query.lower().strip(), count)
+    cached = _SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    params = {
+        "q": query,
+        "count": count
+    }
+
+    try:
+        response = await _HTTP.get(_SEARCH_URL, headers=_HEADERS, params=params)
+        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+
+        # Decode only the fields we use straight from the raw bytes; all others are skipped
+        results = _BRAVE_DECODER.decode(response.content).web.results
+
+        if not results:
+            formatted_results = f"No search results found for '{query}'."
+        else:
+            # Collect lines and join once (linear, unlike repeated string concatenation)
+            parts = ["Search Results:"]
+            for i, result in enumerate(results):
+                title = result.title or 'No Title'
+                url = result.url or 'No URL'
+                parts.append(f"{i+1}. {title}\n   {url}")
+            formatted_results = "\n".join(parts)
+
+    except httpx.HTTPError as e:
+        return f"Error during Brave Search API request: {e}"
+    except Exception as e:
+        return f"An unexpected error occurred during web search: {e}"
+
+    _SEARCH_CACHE[cache_key] = formatted_results
+    return formatted_results
+
+# Caps in-flight Brave requests issued by web_search_many per worker to stay under Brave's rate limits
+_SEARCH_SEM = asyncio.Semaphore(int(os.getenv("SEARCH_CONCURRENCY", "4")))
+
+# Caps concurrent agent runs per worker to respect model rate limits and bound memory
+_AGENT_SEM = asyncio.Semaphore(int(os.getenv("AGENT_CONCURRENCY", "8")))
+
+# Define the Brave Search tool
+@agent.tool
+async def web_search(context: RunContext, query: str, count: int = 5) -> str:
+    """
+    Performs a web search using the Brave Search API.
+
+    Args:
+        query: The search query string.
+        count: The number of results to return (default: 5).
+
+    Returns:
+        A formatted string containing the search results (title and URL)
+        or an error message.
+    """
+    logger.info("--- Executing web_search tool ---") # Add log to confirm tool usage
+    return await _do_search(query, count)
+
+@agent.tool
+async def web_search_many(context: RunContext, queries: list[str], count: int = 5) -> str:
+    """
+    Performs several independent web searches concurrently using the Brave Search API.
+    Use this tool instead of repeated web_search calls when comparing sources or
+    researching multiple topics at once.
+
+    Args:
+        queries: The search query strings.
+        count: The number of results to return per query (default: 5).
+
+    Returns:
+        A formatted string containing the search results for each query
+        or an error message per failed query.
+    """
+    # Drop duplicates (by the same normalization as the search cache) so each query hits Brave once
+    first_by_key = {}
+    for query in queries:
+        first_by_key.setdefault(query.lower().strip(), query)
+    unique_queries = list(first_by_key.values())
+    logger.info("--- Executing web_search_many tool for %d queries ---", len(unique_queries))
+
+    async def bounded_search(query: str) -> str:
+        async with _SEARCH_SEM:
+            return await _do_search(query, count)
+
+    # Queries share the pooled HTTP/2 client, so they overlap on one connection
+    results = await asyncio.gather(*[bounded_search(query) for query in unique_queries])
+    return "\n\n".join(f"Query: {query}\n{result}" for query, result in zip(unique_queries, results))
+
+# Prefixes of the error strings returned by _scrape_url, used by the endpoints to detect failures
+_SCRAPE_ERROR_PREFIXES = (
+    "Error from firecrawl_scrape:",
+    "Error occurred within scrape_website tool",
+    "Unexpected response"
+)
+
+def _mcp_result_text(result) -> str:
+    """
+    Extracts the text (the markdown) from an MCP tool result. Older pydantic-ai releases return the
+    raw mcp CallToolResult; later ones return already unwrapped content (str, dict or list) and raise
+    ModelRetry when the tool reports an error.
+    """
+    if hasattr(result, 'isError'):
+        text_content = "\n".join(part.text for part in result.content if getattr(part, 'type', None) == 'text')
+        if result.isError:
+            raise ModelRetry(text_content)
+        return text_content
+    if isinstance(result, str):
+        return result
+    if isinstance(result, dict):
+        return result.get('markdown') or ''
+    if isinstance(result, list):
+        return "\n".join(_mcp_result_text(part) for part in result)
+    return getattr(result, 'text', None) or ''
+
+async def _scrape_url(url: str) -> str:
+    """
+    Scrapes a URL with the firecrawl_scrape MCP tool and returns its markdown or an error message.
+    """
+    try:
+        # Call firecrawl_scrape directly on the MCP server (kept running by the app lifespan)
+        # instead of spending a second agent.run round trip just to invoke it
+        result = await firecrawl_server.call_tool('firecrawl_scrape', {'url': url, 'formats': ['markdown']})
+        logger.info("Raw result type from MCP tool: %s", type(result)) # Log type
+
+        text_content = _mcp_result_text(result)
+        if text_content:
+            logger.info("Markdown content successfully retrieved.")
+            return text_content # Return the markdown content
+        else:
+            # Log unexpected structure
+            logger.warning("Unexpected result structure from firecrawl_scrape: %s", result)
+            return f"Unexpected response structure from scraping service: {str(result)[:100]}..." # Return error
+
+    except ModelRetry as e:
+        # The tool itself reported an error (isError on the MCP result)
+        error_message = f"Error from firecrawl_scrape: {e}"
+        logger.error(error_message)
+        return error_message # Return error message for the agent
+    except Exception as e:
+        # Log the full traceback for detailed debugging
+        logger.exception("Error within scrape_website tool using firecrawl_scrape via MCP: %s", e)
+        # Provide a more informative error message back to the agent
+        return f"Error occurred within scrape_website tool while trying to scrape URL '{url}': {e}"
+
+# +++ Add tool definition back +++
+@agent.tool
+async def scrape_website(context: RunContext, url: str) -> str:
+    """
+    Scrapes the content of a given URL using the Firecrawl service. Use this tool
+    when asked to scrape or get the content of a specific webpage.
+
+    Args:
+        url: The URL of the website to scrape.
+
+    Returns:
+        The scraped content (typically markdown) or an error message if scraping fails.
+    """
+    logger.info("--- Executing scrape_website tool for URL: %s ---", url)
+    return await _scrape_url(url)
+# +++ End tool definition +++
+
+# --- FastAPI Implementation ---
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Manages resources shared across requests for the lifetime of the app.
+    """
+    # Worker processes do not run the launcher, so make sure logging is set up here too
+    configure_logging()
+    # Start the Firecrawl MCP subprocess once and reuse it for every request
+    async with agent.run_mcp_servers():
+        yield
+    # Close pooled HTTP connections on shutdown
+    await _HTTP.aclose()
+
+app = FastAPI(
+    title="PydanticAI Search Agent API",
+    description="API endpoint to interact with the search agent.",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse # Serialize responses with orjson instead of stdlib json
+)
+
+class QueryRequest(BaseModel):
+    query: str = Field(..., description="The query to send to the agent.")
+
+class QueryResponse(BaseModel):
+    response: str = Field(..., description="The agent's response.")
+
+# +++ Add new models +++
+class ScrapeRequest(BaseModel):
+    url: str = Field(..., description="The URL to scrape.")
+
+class ScrapeResponse(BaseModel):
+    # A concrete str lets pydantic-core validate/serialize natively instead of via the generic Any path
+    content: str = Field(..., description="The scraped content from the URL.")
+# +++ End new models +++
+
+# Recent agent responses keyed on a hash of the normalized query; failed runs are never cached
+_QUERY_CACHE = TTLCache(maxsize=1024, ttl=300)
+
+@app.post("/query", response_model=QueryResponse)
+async def handle_query(request: QueryRequest):
+    """
+    Receives a query, runs it through the PydanticAI agent, and returns the response.
+    """
+    logger.info("Received query: %s", request.query)
+    cache_key = hashlib.blake2b(request.query.strip().lower().encode(), digest_size=16).digest()
+    cached_response = _QUERY_CACHE.get(cache_key)
+    if cached_response is not None:
+        logger.info("Returning cached agent response.")
+        return QueryResponse(response=cached_response)
+
+    logger.info("Thinking...")
+    try:
+        # Run the agent with the user's query
+        async with _AGENT_SEM:
+            result_wrapper = await agent.run(request.query)
+        response_data = result_wrapper.data
+
+        logger.info("Agent response: %s", response_data)
+        _QUERY_CACHE[cache_key] = response_data
+        return QueryResponse(response=response_data)
+
+    except Exception as e:
+        logger.error("An error occurred processing the query: %s", e)
+        # Consider more specific error handling based on potential agent errors
+        raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+
+# +++ Add new endpoint +++
+# ScrapeResponse is kept for the OpenAPI schema only; the handler returns ORJSONResponse directly
+@app.post("/scrape", responses={200: {"model": ScrapeResponse}})
+async def handle_scrape(request: ScrapeRequest):
+    """
+    Receives a URL, uses agent.run to instruct the agent to use the
+    scrape_website tool, and returns the scraped content.
+    """
+    logger.info("Received scrape request for URL: %s", request.url)
+    logger.info("Instructing agent to scrape using agent.run...")
+    try:
+        # Construct the instruction for the agent
+        # Make it clear we want the content from the specific URL using the tool
+        scrape_instruction = f"Please scrape the content of the website at the URL '{request.url}' using the tool and return the raw scraped content."
+        logger.info("Running agent with instruction: \"%s\"", scrape_instruction)
+
+        # Use agent.run - the MCP server is already running for the app lifetime
+        async with _AGENT_SEM:
+            result_wrapper = await agent.run(scrape_instruction)
+        
+        scraped_content = result_wrapper.data # Agent returns the output of the tool
+
+        # Log the type and value for debugging
+        logger.info("Agent run completed. Result type: %s", type(scraped_content))
+        # Avoid logging potentially very large scraped content to logs
+        content_snippet = str(scraped_content)[:200] + "..." if isinstance(scraped_content, str) else "(Non-string content)"
+        logger.info("Scraped content snippet: %s", content_snippet)
+
+        # Check if the tool execution (via agent) returned an error string
+        # (Based on the return values in the scrape_website tool implementation)
+        if isinstance(scraped_content, str) and scraped_content.startswith(_SCRAPE_ERROR_PREFIXES):
+             logger.error("Agent's tool execution resulted in an error: %s", scraped_content)
+             # Return a 500 error, passing the specific error message from the tool/agent
+             raise HTTPException(status_code=500, detail=scraped_content)
+        elif scraped_content is None or scraped_content == "":
+             # Handle cases where the agent might fail to extract or return content
+             logger.error("Agent returned empty or None content after scraping attempt.")
+             raise HTTPException(status_code=500, detail="Agent failed to return scraped content.")
+
+
+        logger.info("Scraping successful via agent.run for URL: %s", request.url)
+        # Skip the Pydantic round trip for potentially multi-MB content
+        return ORJSONResponse({"content": scraped_content})
+
+    except HTTPException as http_exc:
+        # Re-raise HTTP exceptions directly
+        raise http_exc
+    except Exception as e:
+        # Log the full traceback for detailed debugging
+        logger.exception("An error occurred processing the scrape request via agent.run: %s", e)
+        # More generic error as agent.run encapsulates tool errors
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during the agent-driven scraping process: {e}")
+# +++ End new endpoint +++
+
+@app.post("/scrape/raw")
+async def handle_scrape_raw(request: ScrapeRequest):
+    """
+    Receives a URL, scrapes it directly with Firecrawl (no agent run), and returns
+    the raw markdown as the response body instead of wrapping it in a ScrapeResponse.
+    """
+    logger.info("Received raw scrape request for URL: %s", request.url)
+    scraped_content = await _scrape_url(request.url)
+
+    if scraped_content.startswith(_SCRAPE_ERROR_PREFIXES):
+        logger.error("Raw scrape resulted in an error: %s", scraped_content)
+        raise HTTPException(status_code=500, detail=scraped_content)
+
+    # The MCP call returns the whole document at once, so send it as a single body
+    logger.info("Returning raw scraped content for URL: %s", request.url)
+    return Response(scraped_content, media_type="text/markdown")